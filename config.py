@@ -10,28 +10,44 @@ class Config:
     # Database Configuration
     DB_FILE = "local_vector_db.duckdb"
     INCIDENTS_TABLE = "incidents"
+    EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+    EMBEDDING_ONNX_FILE = "onnx/model_qint8_avx512_vnni.onnx"  # Use onnx/model.onnx on CPUs without AVX-512 VNNI
+    EMBEDDING_MAX_SEQ_LENGTH = 128  # Tokens per text, longer input is truncated
+    ENCODE_BATCH_SIZE = 32  # Texts per forward pass when ingesting or batch processing
+    EMBEDDING_DIMENSION = 384  # Output width of EMBEDDING_MODEL_NAME, checked when the model loads
+    VECTOR_INDEX_NAME = "inc_vec_idx"
+    DUCKDB_THREADS = os.cpu_count() or 1
+    DUCKDB_MEMORY_LIMIT = "4GB"
 
     # Jira Configuration
     JIRA_BASE_URL = "https://your-domain.atlassian.net"  # Replace with your Jira instance URL
     JIRA_USERNAME = "your-email@example.com"  # Replace with your Jira email
     JIRA_API_TOKEN = "your-api-token"  # Replace with your Jira API token
+    JIRA_MAX_CONNECTIONS = 20  # Connection pool size for concurrent Jira calls
+    BATCH_MAX_WORKERS = 16  # Concurrent issues in batch processing
 
     # Analysis Configuration
     SIMILARITY_THRESHOLD = 0.3
     MAX_SIMILAR_INCIDENTS = 5
     MIN_INCIDENTS_FOR_ANALYSIS = 3
+    MIN_DESCRIPTION_WORDS = 4  # Shorter descriptions are too vague to search for
+    FUSED_SEARCH_MIN_ROWS = 10_000  # Corpus size above which the fused Numba search is used
+    QUERY_CACHE_SIZE = 4096  # Cached query embeddings and analyses per updater
 
     # LLM Configuration (Optional - for enhanced analysis)
     # Set these if you want to use LLM for better analysis
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "local")  # "local" (int8 ONNX model on CPU) or "openai"
+    LOCAL_LLM_MODEL_ID = "Qwen/Qwen2.5-1.5B-Instruct"  # Model exported by export_local_llm()
+    LOCAL_LLM_PATH = os.getenv("LOCAL_LLM_PATH", "")  # Directory holding the quantized ONNX export
+    LOCAL_LLM_MAX_NEW_TOKENS = 512
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")  # Set your OpenAI API key as environment variable
     LLM_MODEL = "gpt-3.5-turbo"
     LLM_MAX_TOKENS = 1000
 
-    # Gemini AI Configuration (for embeddings)
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")  # Set your Gemini API key as environment variable
-
     # File Paths
     EXCEL_FILE_PATH = "INC.xlsx"
+    EXCEL_CHUNK_SIZE = 50_000  # Rows per chunk when streaming the Excel file
+    JSON_WRITE_WORKERS = 16  # Concurrent writers for per-incident JSON files
 
     # Logging Configuration
     LOG_LEVEL = "INFO"
@@ -66,10 +82,24 @@ class Config:
         """Get Jira credentials as tuple for requests"""
         return (cls.JIRA_USERNAME, cls.JIRA_API_TOKEN)
 
+    @classmethod
+    def get_duckdb_config(cls) -> dict:
+        """Get DuckDB connection settings for parallel, cached scans"""
+        return {
+            'threads': cls.DUCKDB_THREADS,
+            'memory_limit': cls.DUCKDB_MEMORY_LIMIT,
+            'enable_object_cache': True
+        }
+
     @classmethod
     def has_llm_config(cls) -> bool:
         """Check if LLM configuration is available"""
-        return bool(cls.OPENAI_API_KEY and cls.OPENAI_API_KEY != "")
+        if cls.LLM_BACKEND == "openai":
+            return bool(cls.OPENAI_API_KEY and cls.OPENAI_API_KEY != "")
+        return bool(cls.LOCAL_LLM_PATH and os.path.isdir(cls.LOCAL_LLM_PATH))
 
 # Example environment variables setup:
+# export LOCAL_LLM_PATH="models/qwen2.5-1.5b-int8"
+# or, to use OpenAI instead of the local model:
+# export LLM_BACKEND="openai"
 # export OPENAI_API_KEY="your-openai-api-key-here"
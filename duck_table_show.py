@@ -1,12 +1,7 @@
 import duckdb
 from config import Config
 
-# create a connection to a file called 'file.db'
-con = duckdb.connect(Config.DB_FILE)
-# create a table and load data into it
-# con.sql("CREATE TABLE test (i INTEGER)")
-con.sql("SELECT * FROM pg_tablespace")
-# query the table
-con.table("incidents").show()
-# explicitly close the connection
-con.close()
\ No newline at end of file
+# open the database read-only so a running ingest is never blocked
+with duckdb.connect(Config.DB_FILE, read_only=True) as con:
+    # query the table
+    con.sql(f"SELECT * FROM {Config.INCIDENTS_TABLE} LIMIT 20").show()
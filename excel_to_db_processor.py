@@ -1,30 +1,75 @@
 import pandas as pd
 import duckdb
 import numpy as np
-import json
-from typing import List, Dict, Set
+import openpyxl
+import orjson
+import pyarrow as pa
+from typing import List, Dict, Iterator
 import os
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from sentence_transformers import SentenceTransformer
 from config import Config
-import google.generativeai as genai
+from incident_search import load_embedding_model, encode_texts
 
 class ExcelToDBProcessor:
+    # Column order of the incidents table
+    INCIDENT_COLUMNS = [
+        'INC',
+        'Short Desc',
+        'Created Date',
+        'Updated Date',
+        'Assignee',
+        'Group',
+        'Created By',
+        'Updated By ',
+        'vector',
+        'json_file_path'
+    ]
+
+    # Normalizes raw Excel rows (registered as staging_df) into incident columns
+    STAGING_SQL = """
+        SELECT
+            CAST(INC AS VARCHAR) AS INC,
+            CAST("Short Desc" AS VARCHAR) AS "Short Desc",
+            TRY_CAST("Created Date" AS TIMESTAMP) AS "Created Date",
+            TRY_CAST("Updated Date" AS TIMESTAMP) AS "Updated Date",
+            CAST(Assignee AS VARCHAR) AS Assignee,
+            CAST("Group" AS VARCHAR) AS "Group",
+            CAST("Created By" AS VARCHAR) AS "Created By",
+            CAST("Updated By " AS VARCHAR) AS "Updated By "
+        FROM staging_df
+        WHERE INC IS NOT NULL AND CAST(INC AS VARCHAR) <> ''
+    """
+
     def __init__(self):
         self.db_file = Config.DB_FILE
-        # Initialize Gemini AI
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.embed_content(model="models/embedding-001", task_type="retrieval_document")
+        self._model = None
         self.con = None
+        self.vss_available = False
         self.setup_database()
 
+    @property
+    def model(self) -> SentenceTransformer:
+        """Embedding model, the same one the updaters embed queries with"""
+        if self._model is None:
+            self._model = load_embedding_model()
+        return self._model
+
     def setup_database(self):
         """Setup DuckDB database and create incidents table if it doesn't exist"""
         try:
             # Connect to database in read-write mode
-            self.con = duckdb.connect(database=self.db_file, read_only=False)
+            self.con = duckdb.connect(database=self.db_file, read_only=False, config=Config.get_duckdb_config())
+
+            # Load the vector similarity extension for HNSW indexes
+            self.vss_available = self.load_vss()
 
-            # Create incidents table if it doesn't exist
-            create_table_sql = """
+            # Create incidents table if it doesn't exist. The vector column stays
+            # FLOAT rather than quantized int8: vss HNSW indexes only support
+            # FLOAT arrays, and the index already avoids scanning the column
+            create_table_sql = f"""
             CREATE TABLE IF NOT EXISTS incidents (
                 INC VARCHAR PRIMARY KEY,
                 "Short Desc" TEXT,
@@ -34,26 +79,158 @@ class ExcelToDBProcessor:
                 "Group" VARCHAR,
                 "Created By" VARCHAR,
                 "Updated By " VARCHAR,
-                vector FLOAT[],
+                vector FLOAT[{Config.EMBEDDING_DIMENSION}],
                 json_file_path VARCHAR
             )
             """
             self.con.execute(create_table_sql)
+            self.migrate_vector_column()
             print("✅ Database setup completed")
 
         except Exception as e:
             print(f"❌ Error setting up database: {e}")
             raise
 
-    def read_excel_file(self, excel_path: str) -> pd.DataFrame:
-        """Read Excel file and return DataFrame"""
+    def load_vss(self) -> bool:
+        """Load the vss extension, installing it if needed; False when unavailable"""
+        try:
+            try:
+                self.con.execute("LOAD vss")
+            except duckdb.Error:
+                self.con.execute("INSTALL vss")
+                self.con.execute("LOAD vss")
+            self.con.execute("SET hnsw_enable_experimental_persistence = true")
+            return True
+
+        except duckdb.Error as e:
+            # Offline or air-gapped: ingest still works and the updaters
+            # fall back to in-memory similarity search
+            print(f"⚠️  vss extension unavailable, the vector index will be skipped: {e}")
+            return False
+
+    def migrate_vector_column(self):
+        """Migrate tables whose vector column predates the fixed-width FLOAT[N] schema"""
+        expected_type = f"FLOAT[{Config.EMBEDDING_DIMENSION}]"
+        column_type = self.con.execute("""
+            SELECT data_type
+            FROM information_schema.columns
+            WHERE table_name = 'incidents' AND column_name = 'vector'
+        """).fetchone()[0]
+        if column_type == expected_type:
+            return
+
+        # Vectors in the old column came from a different embedding model, so
+        # they are cleared here and re-embedded by embed_missing_vectors
+        print(f"🔄 Migrating vector column from {column_type} to {expected_type}")
+        self.con.execute(f"DROP INDEX IF EXISTS {Config.VECTOR_INDEX_NAME}")
+        self.con.execute(f"ALTER TABLE incidents ALTER vector SET DATA TYPE {expected_type} USING NULL")
+
+    def embed_missing_vectors(self):
+        """Embed stored incidents that have a short description but no vector"""
+        try:
+            missing = self.con.execute("""
+                SELECT INC, "Short Desc"
+                FROM incidents
+                WHERE vector IS NULL AND coalesce("Short Desc", '') <> ''
+            """).df()
+            if missing.empty:
+                return
+
+            matrix = self.generate_embeddings(missing['Short Desc'].tolist())
+            table = pa.table({
+                'INC': pa.array(missing['INC'], type=pa.string()),
+                'vector': pa.FixedSizeListArray.from_arrays(
+                    pa.array(matrix.ravel(), type=pa.float32()),
+                    Config.EMBEDDING_DIMENSION
+                )
+            })
+
+            self.con.register("embedded_vectors", table)
+            try:
+                self.con.execute("""
+                    UPDATE incidents
+                    SET vector = embedded_vectors.vector
+                    FROM embedded_vectors
+                    WHERE incidents.INC = embedded_vectors.INC
+                """)
+            finally:
+                self.con.unregister("embedded_vectors")
+
+            print(f"✅ Embedded {len(missing)} stored incidents without vectors")
+
+        except Exception as e:
+            print(f"❌ Error embedding stored incidents: {e}")
+            raise
+
+    def create_vector_index(self):
+        """Create the HNSW index used for approximate nearest-neighbour search"""
+        if not self.vss_available:
+            print("⚠️  Skipping vector index, vss extension is not loaded")
+            return
+
+        try:
+            self.con.execute(f"""
+                CREATE INDEX IF NOT EXISTS {Config.VECTOR_INDEX_NAME}
+                ON incidents USING HNSW (vector) WITH (metric = 'ip')
+            """)
+            print("✅ Vector index ready")
+
+        except duckdb.Error as e:
+            # Search still works without the index, it just scans in memory
+            print(f"⚠️  Could not create vector index, skipping it: {e}")
+
+    def normalize_excel_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add missing optional columns as NULL and parse date columns before staging"""
+        # STAGING_SQL references every incident column, so sheets without
+        # e.g. "Updated By " would otherwise fail to bind
+        missing = [column for column in self.INCIDENT_COLUMNS[:8] if column not in df.columns]
+        df = df.assign(**{column: None for column in missing})
+
+        # Excel cells may hold datetimes or text in any common format; a plain
+        # TRY_CAST only accepts ISO strings and would silently drop the rest
+        parsed_dates = {}
+        for column in ['Created Date', 'Updated Date']:
+            parsed = pd.to_datetime(df[column], errors='coerce', format='mixed')
+            unparsed = parsed.isna() & df[column].notna() & (df[column].astype(str).str.strip() != '')
+            if unparsed.any():
+                print(f"⚠️  {unparsed.sum()} '{column}' values could not be parsed and will be stored as NULL")
+            parsed_dates[column] = parsed
+
+        return df.assign(**parsed_dates)
+
+    def query_staged(self, df: pd.DataFrame, sql: str) -> pd.DataFrame:
+        """Run SQL against a DataFrame registered as staging_df"""
+        self.con.register("staging_df", df)
+        try:
+            return self.con.execute(sql).df()
+        finally:
+            self.con.unregister("staging_df")
+
+    def read_excel_chunks(self, excel_path: str, chunk_size: int = None) -> Iterator[pd.DataFrame]:
+        """Stream the Excel file as DataFrames of at most chunk_size rows"""
+        if chunk_size is None:
+            chunk_size = Config.EXCEL_CHUNK_SIZE
+
         try:
             if not os.path.exists(excel_path):
                 raise FileNotFoundError(f"Excel file not found: {excel_path}")
 
-            df = pd.read_excel(excel_path)
-            print(f"✅ Successfully read Excel file with {len(df)} rows")
-            return df
+            # Read-only mode streams rows instead of loading the whole workbook
+            wb = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+            try:
+                rows = wb.active.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    return
+
+                total_rows = 0
+                for chunk in iter(lambda: list(itertools.islice(rows, chunk_size)), []):
+                    total_rows += len(chunk)
+                    yield pd.DataFrame(chunk, columns=header)
+
+                print(f"✅ Successfully read Excel file with {total_rows} rows")
+            finally:
+                wb.close()
 
         except Exception as e:
             print(f"❌ Error reading Excel file: {e}")
@@ -65,36 +242,32 @@ class ExcelToDBProcessor:
             # Ensure JSON directory exists
             os.makedirs(json_dir, exist_ok=True)
 
-            json_files_created = []
-
-            for _, row in df.iterrows():
-                inc_number = str(row.get('INC', ''))
+            # Format dates as ISO strings column-wise instead of per record
+            records = self.query_staged(df, f"""
+                SELECT * REPLACE (
+                    strftime("Created Date", '%Y-%m-%dT%H:%M:%S') AS "Created Date",
+                    strftime("Updated Date", '%Y-%m-%dT%H:%M:%S') AS "Updated Date"
+                )
+                FROM ({self.STAGING_SQL})
+            """)
 
-                # Skip if INC is empty or None
-                if not inc_number or inc_number == 'nan':
-                    continue
-
-                # Create individual JSON data for this record
-                record_data = {
-                    'INC': inc_number,
-                    'Short Desc': str(row.get('Short Desc', '')),
-                    'Created Date': pd.to_datetime(row.get('Created Date', None)).isoformat() if row.get('Created Date') else None,
-                    'Updated Date': pd.to_datetime(row.get('Updated Date', None)).isoformat() if row.get('Updated Date') else None,
-                    'Assignee': str(row.get('Assignee', '')),
-                    'Group': str(row.get('Group', '')),
-                    'Created By': str(row.get('Created By', '')),
-                    'Updated By ': str(row.get('Updated By ', ''))
-                }
+            # One writer per file: a repeated INC keeps its last row, as the
+            # previous serial loop did by overwriting
+            records = records.drop_duplicates(subset=['INC'], keep='last')
 
+            def write_record(record_data: Dict) -> str:
                 # Create JSON file path for this INC
-                json_file_path = os.path.join(json_dir, f"{inc_number}.json")
+                json_file_path = os.path.join(json_dir, f"{record_data['INC']}.json")
 
                 # Write individual JSON file
-                with open(json_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(record_data, f, indent=2, ensure_ascii=False)
+                with open(json_file_path, 'wb') as f:
+                    f.write(orjson.dumps(record_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+
+                return json_file_path
 
-                json_files_created.append(json_file_path)
-                print(f"✅ Created JSON file: {json_file_path}")
+            # File writes release the GIL, so a thread pool parallelizes them
+            with ThreadPoolExecutor(max_workers=Config.JSON_WRITE_WORKERS) as executor:
+                json_files_created = list(executor.map(write_record, records.to_dict('records')))
 
             print(f"✅ Created {len(json_files_created)} individual JSON files")
             return json_files_created
@@ -103,116 +276,76 @@ class ExcelToDBProcessor:
             print(f"❌ Error creating JSON files: {e}")
             raise
 
-    def get_existing_incidents(self) -> Set[str]:
-        """Get set of existing INC numbers from database"""
+    def count_incidents(self) -> int:
+        """Count incidents stored in the database"""
         try:
-            result = self.con.execute("SELECT INC FROM incidents").fetchall()
-            existing_incs = {row[0] for row in result}
-            print(f"✅ Found {len(existing_incs)} existing incidents in database")
-            return existing_incs
+            return self.con.execute("SELECT COUNT(*) FROM incidents").fetchone()[0]
 
         except Exception as e:
-            print(f"❌ Error fetching existing incidents: {e}")
-            return set()
+            print(f"❌ Error counting incidents: {e}")
+            return 0
 
-    def generate_embedding(self, text: str) -> List[float]:
-        """Generate vector embedding for text using Gemini"""
-        try:
-            result = genai.embed_content(
-                model="models/embedding-001",
-                content=text,
-                task_type="retrieval_document"
-            )
-            return result['embedding']
-
-        except Exception as e:
-            print(f"❌ Error generating embedding: {e}")
-            return []
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generate L2-normalized vector embeddings for many texts in batched forward passes"""
+        if not texts:
+            return np.empty((0, Config.EMBEDDING_DIMENSION), dtype=np.float32)
+        return encode_texts(self.model, texts)
 
-    def prepare_incident_data(self, df: pd.DataFrame, json_dir: str) -> List[Dict]:
+    def prepare_incident_data(self, df: pd.DataFrame, json_dir: str) -> pd.DataFrame:
         """Prepare incident data with embeddings and JSON file paths"""
-        existing_incs = self.get_existing_incidents()
-        new_incidents = []
-
-        for _, row in df.iterrows():
-            inc_number = str(row.get('INC', ''))
-
-            # Skip if INC already exists
-            if inc_number in existing_incs:
-                print(f"⏭️  Skipping existing INC: {inc_number}")
-                continue
-
-            # Skip if INC is empty or None
-            if not inc_number or inc_number == 'nan':
-                continue
-
-            # Create JSON file path for this INC
-            json_file_path = os.path.join(json_dir, f"{inc_number}.json")
-
-            # Prepare incident data
-            incident = {
-                'INC': inc_number,
-                'Short Desc': str(row.get('Short Desc', '')),
-                'Created Date': pd.to_datetime(row.get('Created Date', None)).isoformat() if row.get('Created Date') else None,
-                'Updated Date': pd.to_datetime(row.get('Updated Date', None)).isoformat() if row.get('Updated Date') else None,
-                'Assignee': str(row.get('Assignee', '')),
-                'Group': str(row.get('Group', '')),
-                'Created By': str(row.get('Created By', '')),
-                'Updated By ': str(row.get('Updated By ', '')),
-                'json_file_path': json_file_path
-            }
-
-            # Generate embedding for short description
-            short_desc = incident['Short Desc']
-            if short_desc:
-                incident['vector'] = self.generate_embedding(short_desc)
-            else:
-                incident['vector'] = []
-
-            new_incidents.append(incident)
-
+        # Excel exports can repeat an INC; keep the first row for each
+        df = df.dropna(subset=['INC']).drop_duplicates(subset=['INC'])
+
+        # Normalize columns and anti-join away existing incidents inside DuckDB
+        new_incidents = self.query_staged(df, f"""
+            SELECT s.*
+            FROM ({self.STAGING_SQL}) s
+            ANTI JOIN incidents i ON s.INC = i.INC
+        """)
+
+        new_incidents['json_file_path'] = [
+            os.path.join(json_dir, f"{inc_number}.json") if json_dir else None
+            for inc_number in new_incidents['INC']
+        ]
+
+        # Embed each distinct non-empty short description once, in batches,
+        # and share the vector between incidents with the same text
+        descriptions = new_incidents['Short Desc']
+        unique_texts = descriptions[descriptions.fillna('') != ''].unique().tolist()
+        embeddings = dict(zip(unique_texts, self.generate_embeddings(unique_texts)))
+        new_incidents['vector'] = [embeddings.get(text) for text in descriptions]
+
+        print(f"⏭️  Skipped {len(df) - len(new_incidents)} existing or empty incidents")
         print(f"✅ Prepared {len(new_incidents)} new incidents for insertion")
-        return new_incidents
+        return new_incidents[self.INCIDENT_COLUMNS]
 
-    def insert_incidents(self, incidents: List[Dict]):
+    def insert_incidents(self, incidents: pd.DataFrame):
         """Insert incidents into database"""
-        if not incidents:
+        if incidents.empty:
             print("ℹ️  No new incidents to insert")
             return
 
         try:
-            # Insert incidents in batches
-            batch_size = 100
-            total_inserted = 0
-
-            for i in range(0, len(incidents), batch_size):
-                batch = incidents[i:i + batch_size]
-
-                # Prepare values for batch insert
-                values = []
-                for incident in batch:
-                    values.append((
-                        incident['INC'],
-                        incident['Short Desc'],
-                        incident['Created Date'],
-                        incident['Updated Date'],
-                        incident['Assignee'],
-                        incident['Group'],
-                        incident['Created By'],
-                        incident['Updated By '],
-                        incident['vector'],
-                        incident['json_file_path']
-                    ))
-
-                # Insert batch
-                self.con.executemany("""
-                    INSERT INTO incidents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, values)
-
-                total_inserted += len(batch)
-                print(f"✅ Inserted batch {i//batch_size + 1}: {len(batch)} incidents")
-
-            print(f"✅ Successfully inserted {total_inserted} new incidents into database")
+            # Hand DuckDB an Arrow table whose vector column is already a
+            # contiguous fixed-size float32 array matching FLOAT[N]
+            dimension = Config.EMBEDDING_DIMENSION
+            vectors = incidents['vector']
+            present = vectors.notna().to_numpy()
+            matrix = np.zeros((len(vectors), dimension), dtype=np.float32)
+            if present.any():
+                matrix[present] = np.vstack(vectors[present].to_numpy())
+            vector_array = pa.FixedSizeListArray.from_arrays(
+                pa.array(matrix.ravel(), type=pa.float32()),
+                dimension,
+                mask=pa.array(~present)
+            )
+
+            table = pa.Table.from_pandas(incidents.drop(columns=['vector']), preserve_index=False)
+            table = table.add_column(self.INCIDENT_COLUMNS.index('vector'), 'vector', vector_array)
+
+            self.con.from_arrow(table).insert_into("incidents")
+
+            print(f"✅ Successfully inserted {len(incidents)} new incidents into database")
 
         except Exception as e:
             print(f"❌ Error inserting incidents: {e}")
@@ -224,29 +357,40 @@ class ExcelToDBProcessor:
             print(f"🚀 Starting Excel to Database processing...")
             print(f"📁 Excel file: {excel_path}")
 
-            # Read Excel file
-            df = self.read_excel_file(excel_path)
+            total_rows = 0
+            new_count = 0
+
+            # Process the Excel file chunk by chunk to keep memory bounded
+            for df in self.read_excel_chunks(excel_path):
+                total_rows += len(df)
+                df = self.normalize_excel_rows(df)
+
+                # Convert to JSON if directory provided
+                if json_dir:
+                    self.convert_to_json(df, json_dir)
+
+                # Prepare incident data with embeddings
+                incidents = self.prepare_incident_data(df, json_dir)
 
-            # Convert to JSON if directory provided
-            if json_dir:
-                json_files = self.convert_to_json(df, json_dir)
+                # Insert into database
+                self.insert_incidents(incidents)
+                new_count += len(incidents)
 
-            # Prepare incident data with embeddings
-            incidents = self.prepare_incident_data(df, json_dir)
+            # Re-embed incidents left without vectors, e.g. by a schema migration
+            self.embed_missing_vectors()
 
-            # Insert into database
-            self.insert_incidents(incidents)
+            # Index vectors after the bulk load so the graph is built once
+            self.create_vector_index()
 
             print("✅ Excel to Database processing completed successfully!")
 
             # Print summary
-            total_rows = len(df)
-            existing_count = len(self.get_existing_incidents())
+            existing_count = self.count_incidents()
             print("""
 📊 Summary:""")
             print(f"   • Total rows in Excel: {total_rows}")
             print(f"   • Existing incidents in DB: {existing_count}")
-            print(f"   • New incidents added: {len(incidents)}")
+            print(f"   • New incidents added: {new_count}")
 
         except Exception as e:
             print(f"❌ Error in process_excel_to_db: {e}")
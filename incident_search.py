@@ -0,0 +1,95 @@
+"""
+Similarity search pieces shared by the ingest processor and the Jira comment updaters
+"""
+
+import duckdb
+import numpy as np
+import onnxruntime as ort
+from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Tuple
+from config import Config
+
+# Incident fields returned by similarity search, in result-dict order
+INCIDENT_FIELDS = ['INC', 'Short Desc', 'Created Date', 'Updated Date', 'Assignee', 'Group', 'Created By', 'Updated By']
+INCIDENT_COLUMNS_SQL = '"INC", "Short Desc", "Created Date", "Updated Date", "Assignee", "Group", "Created By", "Updated By "'
+
+# Stored and query vectors are L2-normalized, so the inner product is the
+# cosine similarity. Ordering by it lets the HNSW index serve the top-K,
+# the threshold is applied to that small candidate set. The query vector is
+# bound as a float32 ndarray, so no Python float is built per element
+SIMILARITY_SQL = f"""
+SELECT *
+FROM (
+    SELECT {INCIDENT_COLUMNS_SQL},
+           array_inner_product(vector, $query_vector::FLOAT[{Config.EMBEDDING_DIMENSION}]) AS similarity
+    FROM incidents
+    ORDER BY array_negative_inner_product(vector, $query_vector::FLOAT[{Config.EMBEDDING_DIMENSION}])
+    LIMIT $limit
+)
+WHERE similarity >= $threshold
+ORDER BY similarity DESC
+"""
+
+def load_incident_vectors(con: duckdb.DuckDBPyConnection) -> Tuple[np.ndarray, Dict[str, list]]:
+    """Read every embedded incident as a float32 matrix plus metadata columns"""
+    table = con.execute(f"""
+        SELECT {INCIDENT_COLUMNS_SQL}, vector
+        FROM incidents
+        WHERE vector IS NOT NULL
+    """).fetch_arrow_table()
+
+    # FLOAT[N] arrives as a fixed-size list; its flattened values reshape
+    # into the matrix without a Python object per element
+    vectors = table.column('vector').combine_chunks()
+    matrix = vectors.flatten().to_numpy(zero_copy_only=False)
+    matrix = matrix.astype(np.float32, copy=False).reshape(len(vectors), Config.EMBEDDING_DIMENSION)
+
+    # Metadata stays as Python values (None for NULL, datetime for timestamps)
+    # so it hashes, counts and formats the same as rows from the SQL search
+    meta = {field: table.column(i).to_pylist() for i, field in enumerate(INCIDENT_FIELDS)}
+    return matrix, meta
+
+def load_embedding_model() -> SentenceTransformer:
+    """Load the sentence embedding model on the quantized ONNX Runtime backend"""
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    model = SentenceTransformer(
+        Config.EMBEDDING_MODEL_NAME,
+        backend="onnx",
+        model_kwargs={
+            "file_name": Config.EMBEDDING_ONNX_FILE,
+            "provider": "CPUExecutionProvider",
+            "session_options": session_options
+        }
+    )
+    model.max_seq_length = Config.EMBEDDING_MAX_SEQ_LENGTH
+
+    # Stored vectors, the FLOAT[N] column and the search SQL all assume this width
+    dimension = model.get_sentence_embedding_dimension()
+    if dimension != Config.EMBEDDING_DIMENSION:
+        raise ValueError(
+            f"{Config.EMBEDDING_MODEL_NAME} produces {dimension}-dimensional embeddings, "
+            f"but Config.EMBEDDING_DIMENSION is {Config.EMBEDDING_DIMENSION}"
+        )
+    return model
+
+def is_searchable(description: str) -> bool:
+    """Check that a description has enough words for retrieval to be meaningful"""
+    # Stubs like "." or "login broken" match everything equally badly
+    return len(description.split()) >= Config.MIN_DESCRIPTION_WORDS
+
+def encode_texts(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
+    """Embed texts as L2-normalized float32 rows in batched forward passes"""
+    return model.encode(
+        texts,
+        batch_size=Config.ENCODE_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    ).astype(np.float32, copy=False)
+
+def encode_query(model: SentenceTransformer, text: str) -> np.ndarray:
+    """Embed a Jira description as a read-only, L2-normalized vector"""
+    query_vector = encode_texts(model, [text])[0]
+    query_vector.setflags(write=False)
+    return query_vector
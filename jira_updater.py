@@ -3,10 +3,34 @@ from sentence_transformers import SentenceTransformer
 import duckdb
 import numpy as np
 import json
+import orjson
+import asyncio
+import httpx
 import requests
 from typing import List, Dict, Optional
 import os
+import copy
+import functools
+from collections import Counter
 from datetime import datetime
+from config import Config
+from incident_search import INCIDENT_FIELDS, SIMILARITY_SQL, load_incident_vectors, \
+    load_embedding_model, is_searchable, encode_query
+
+@functools.lru_cache(maxsize=1)
+def _get_model() -> SentenceTransformer:
+    """Load the sentence embedding model once per process"""
+    return load_embedding_model()
+
+@functools.lru_cache(maxsize=None)
+def _get_connection(db_file: str) -> duckdb.DuckDBPyConnection:
+    """Open one read-only DuckDB connection per database file for the process"""
+    con = duckdb.connect(database=db_file, read_only=True, config=Config.get_duckdb_config())
+    try:
+        con.execute("LOAD vss")
+    except duckdb.Error as e:
+        print(f"⚠️  vss extension unavailable, using in-memory similarity search: {e}")
+    return con
 
 class JiraCommentUpdater:
     def __init__(self, db_file: str, jira_base_url: str, jira_username: str, jira_api_token: str):
@@ -14,8 +38,12 @@ class JiraCommentUpdater:
         self.jira_base_url = jira_base_url.rstrip('/')
         self.jira_username = jira_username
         self.jira_api_token = jira_api_token
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.con = duckdb.connect(database=self.db_file, read_only=True)
+        self.model = _get_model()
+        self.con = _get_connection(self.db_file)
+
+        # Cache query embeddings and analyses for repeated descriptions
+        self._encode_query = functools.lru_cache(maxsize=Config.QUERY_CACHE_SIZE)(self._encode_query)
+        self._analyze_incident_set = functools.lru_cache(maxsize=Config.QUERY_CACHE_SIZE)(self._analyze_incident_set)
 
         # Setup authentication
         self.auth = (self.jira_username, self.jira_api_token)
@@ -24,48 +52,86 @@ class JiraCommentUpdater:
             'Accept': 'application/json'
         }
 
-    def cosine_similarity(self, a, b):
-        """Calculate cosine similarity between two vectors"""
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+        # Reuse one HTTP connection pool for all Jira API calls
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.headers.update(self.headers)
+
+        # Without the vss extension, search the corpus in memory with BLAS
+        self.vss_available = self.con.execute(
+            "SELECT COUNT(*) FROM duckdb_extensions() WHERE extension_name = 'vss' AND loaded"
+        ).fetchone()[0] > 0
+        self.corpus = None
+        self.corpus_meta = None
+        if not self.vss_available:
+            self.load_corpus()
+
+    def load_corpus(self):
+        """Load all incident vectors into a normalized in-memory matrix"""
+        corpus, corpus_meta = load_incident_vectors(self.con)
+        norms = np.linalg.norm(corpus, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        self.corpus = np.ascontiguousarray(corpus / norms)
+        # Python values, so the cached analysis can hash NULLs and dates
+        self.corpus_meta = [corpus_meta[field] for field in INCIDENT_FIELDS]
+
+    def _search_corpus(self, query_vector: np.ndarray, threshold: float, limit: int) -> List[Dict]:
+        """Rank the in-memory corpus with a single matrix-vector product"""
+        sims = self.corpus @ query_vector.astype(np.float32)
+        limit = min(limit, len(sims))
+        if limit <= 0:
+            return []
+
+        top = np.argpartition(-sims, limit - 1)[:limit]
+        top = top[np.argsort(-sims[top])]
+
+        return [
+            {**{field: column[i] for field, column in zip(INCIDENT_FIELDS, self.corpus_meta)}, 'similarity': float(sims[i])}
+            for i in top
+            if sims[i] >= threshold
+        ]
+
+    def _encode_query(self, text: str) -> np.ndarray:
+        """Embed a Jira description, cached per updater"""
+        return encode_query(self.model, text)
 
     def search_similar_incidents(self, jira_description: str, threshold: float = 0.3, limit: int = 5) -> List[Dict]:
         """Search for similar incidents based on Jira description"""
-        # Generate embedding for the Jira description
-        query_vector = self.model.encode([jira_description])[0]
+        if not is_searchable(jira_description):
+            return []
 
-        # Create similarity function in DuckDB
-        self.con.create_function("cosine_similarity", self.cosine_similarity, ["FLOAT[]", "FLOAT[]"], float)
+        # Generate embedding for the Jira description
+        query_vector = self._encode_query(jira_description)
 
-        # Search query
-        sql_query = """
-        SELECT "INC", "Short Desc", "Created Date", "Updated Date", "Assignee", "Group", "Created By", "Updated By",
-               cosine_similarity(vector, ?::FLOAT[]) AS similarity
-        FROM incidents
-        ORDER BY similarity DESC
-        LIMIT ?
-        """
+        if self.corpus is not None:
+            return self._search_corpus(query_vector, threshold, limit)
 
-        results = self.con.execute(sql_query, [query_vector.tolist(), limit]).fetchall()
+        results = self.con.execute(SIMILARITY_SQL, {
+            'query_vector': query_vector,
+            'limit': limit,
+            'threshold': threshold
+        }).fetchall()
 
         similar_incidents = []
         for row in results:
-            if row[8] >= threshold:  # similarity score
-                similar_incidents.append({
-                    'INC': row[0],
-                    'Short Desc': row[1],
-                    'Created Date': row[2],
-                    'Updated Date': row[3],
-                    'Assignee': row[4],
-                    'Group': row[5],
-                    'Created By': row[6],
-                    'Updated By': row[7],
-                    'similarity': row[8]
-                })
+            similar_incidents.append({**dict(zip(INCIDENT_FIELDS, row)), 'similarity': row[8]})
 
         return similar_incidents
 
     def analyze_historical_patterns(self, similar_incidents: List[Dict], jira_description: str) -> Dict:
         """Analyze historical patterns using LLM to determine similar fixes"""
+        # The rule-based analysis only depends on who handled which incidents,
+        # so identical incident lists reuse the cached result. The key keeps
+        # similarity order because count ties go to the most similar incident
+        incident_set = tuple(
+            (incident['INC'], incident.get('Assignee', 'Unknown'), incident.get('Group', 'Unknown'))
+            for incident in similar_incidents
+        )
+        return copy.deepcopy(self._analyze_incident_set(incident_set))
+
+    def _analyze_incident_set(self, incident_set: tuple) -> Dict:
+        """Analyze a similarity-ordered tuple of (INC, Assignee, Group) entries"""
         # This is a placeholder for LLM analysis
         # In a real implementation, you would integrate with OpenAI, Claude, or another LLM
 
@@ -76,43 +142,30 @@ class JiraCommentUpdater:
             'confidence_score': 0.0
         }
 
-        if not similar_incidents:
+        if not incident_set:
             return analysis
 
-        # Group by assignee and group to find patterns
-        assignee_patterns = {}
-        group_patterns = {}
-
-        for incident in similar_incidents:
-            assignee = incident.get('Assignee', 'Unknown')
-            group = incident.get('Group', 'Unknown')
+        # Count assignees and groups to find the most common ones
+        assignee_counts = Counter(assignee for _, assignee, _ in incident_set)
+        group_counts = Counter(group for _, _, group in incident_set)
 
-            if assignee not in assignee_patterns:
-                assignee_patterns[assignee] = []
-            assignee_patterns[assignee].append(incident)
-
-            if group not in group_patterns:
-                group_patterns[group] = []
-            group_patterns[group].append(incident)
-
-        # Find most common assignee and group
-        most_common_assignee = max(assignee_patterns.keys(), key=lambda k: len(assignee_patterns[k]))
-        most_common_group = max(group_patterns.keys(), key=lambda k: len(group_patterns[k]))
+        most_common_assignee, _ = assignee_counts.most_common(1)[0]
+        most_common_group, _ = group_counts.most_common(1)[0]
 
         analysis['similar_patterns'] = [
             f"Most incidents handled by: {most_common_assignee}",
             f"Most incidents in group: {most_common_group}",
-            f"Total similar incidents found: {len(similar_incidents)}"
+            f"Total similar incidents found: {len(incident_set)}"
         ]
 
         # Generate recommended actions based on patterns
-        if len(similar_incidents) >= 3:
+        if len(incident_set) >= 3:
             analysis['recommended_actions'] = [
                 f"Assign to {most_common_assignee} as they have handled similar incidents",
                 f"Consider involving {most_common_group} team",
                 "Review past solutions from similar incidents"
             ]
-            analysis['confidence_score'] = min(0.8, len(similar_incidents) * 0.15)
+            analysis['confidence_score'] = min(0.8, len(incident_set) * 0.15)
 
         return analysis
 
@@ -120,10 +173,10 @@ class JiraCommentUpdater:
         """Get Jira issue details"""
         url = f"{self.jira_base_url}/rest/api/2/issue/{issue_key}"
         try:
-            response = requests.get(url, auth=self.auth, headers=self.headers)
+            response = self.session.get(url)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return orjson.loads(response.content)
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             print(f"Error fetching Jira issue {issue_key}: {e}")
             return None
 
@@ -133,7 +186,7 @@ class JiraCommentUpdater:
         payload = {"body": comment}
 
         try:
-            response = requests.post(url, auth=self.auth, headers=self.headers, json=payload)
+            response = self.session.post(url, data=orjson.dumps(payload))
             response.raise_for_status()
             print(f"Successfully added comment to {issue_key}")
             return True
@@ -141,18 +194,43 @@ class JiraCommentUpdater:
             print(f"Error updating Jira comment for {issue_key}: {e}")
             return False
 
+    async def get_jira_issue_async(self, client: httpx.AsyncClient, issue_key: str) -> Optional[Dict]:
+        """Get Jira issue details over a shared async client"""
+        url = f"{self.jira_base_url}/rest/api/2/issue/{issue_key}"
+        try:
+            response = await client.get(url)
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            print(f"Error fetching Jira issue {issue_key}: {e}")
+            return None
+
+    async def update_jira_comment_async(self, client: httpx.AsyncClient, issue_key: str, comment: str) -> bool:
+        """Update Jira issue with a comment over a shared async client"""
+        url = f"{self.jira_base_url}/rest/api/2/issue/{issue_key}/comment"
+        payload = {"body": comment}
+
+        try:
+            response = await client.post(url, content=orjson.dumps(payload))
+            response.raise_for_status()
+            print(f"Successfully added comment to {issue_key}")
+            return True
+        except httpx.HTTPError as e:
+            print(f"Error updating Jira comment for {issue_key}: {e}")
+            return False
+
     def generate_analysis_comment(self, jira_description: str, similar_incidents: List[Dict], analysis: Dict) -> str:
         """Generate a comprehensive comment for Jira based on analysis"""
 
-        comment = f"""🔍 **Automated Analysis for Incident**
+        parts = [f"""🔍 **Automated Analysis for Incident**
 
 **Original Description:** {jira_description}
 
 **Similar Historical Incidents Found:**
-"""
+"""]
 
-        for incident in similar_incidents:
-            comment += f"""
+        parts.extend(
+            f"""
 • **INC-{incident['INC']}**: {incident['Short Desc']}
   - Created: {incident['Created Date']}
   - Updated: {incident['Updated Date']}
@@ -160,41 +238,38 @@ class JiraCommentUpdater:
   - Group: {incident['Group']}
   - Similarity: {incident['similarity']:.2f}
 """
+            for incident in similar_incidents
+        )
 
-        comment += f"""
+        parts.append(f"""
 **Analysis Summary:**
 - {analysis['similar_patterns'][0]}
 - {analysis['similar_patterns'][1]}
 - {analysis['similar_patterns'][2]}
 
 **Recommended Actions:**
-"""
-        for action in analysis['recommended_actions']:
-            comment += f"• {action}\n"
+""")
+        parts.extend(f"• {action}\n" for action in analysis['recommended_actions'])
 
-        comment += f"""
+        parts.append(f"""
 **Confidence Score:** {analysis['confidence_score']:.2f}
 
 ---
 *This analysis was generated automatically based on historical incident data.*
-"""
-        return comment
+""")
+        return "".join(parts)
 
-    def process_jira_issue(self, issue_key: str, threshold: float = 0.3) -> bool:
-        """Main function to process a Jira issue and update its comments"""
-        print(f"Processing Jira issue: {issue_key}")
-
-        # Get Jira issue details
-        issue = self.get_jira_issue(issue_key)
+    def build_issue_comment(self, issue_key: str, issue: Optional[Dict], threshold: float = 0.3) -> Optional[str]:
+        """Analyze a fetched Jira issue and return the comment to add, if any"""
         if not issue:
             print(f"Could not fetch issue {issue_key}")
-            return False
+            return None
 
         # Extract description
         description = issue['fields'].get('description', '')
         if not description:
             print(f"No description found for issue {issue_key}")
-            return False
+            return None
 
         print(f"Analyzing description: {description[:100]}...")
 
@@ -203,18 +278,52 @@ class JiraCommentUpdater:
 
         if not similar_incidents:
             print(f"No similar incidents found for {issue_key}")
-            return False
+            return None
 
         print(f"Found {len(similar_incidents)} similar incidents")
 
         # Perform historical analysis
         analysis = self.analyze_historical_patterns(similar_incidents, description)
 
-        # Generate and add comment
-        comment = self.generate_analysis_comment(description, similar_incidents, analysis)
-        success = self.update_jira_comment(issue_key, comment)
+        # Generate comment
+        return self.generate_analysis_comment(description, similar_incidents, analysis)
+
+    def process_jira_issue(self, issue_key: str, threshold: float = 0.3) -> bool:
+        """Main function to process a Jira issue and update its comments"""
+        print(f"Processing Jira issue: {issue_key}")
+
+        # Get Jira issue details
+        issue = self.get_jira_issue(issue_key)
+
+        comment = self.build_issue_comment(issue_key, issue, threshold)
+        if comment is None:
+            return False
+
+        # Add comment
+        return self.update_jira_comment(issue_key, comment)
+
+    async def process_many(self, issue_keys: List[str], threshold: float = 0.3) -> Dict[str, bool]:
+        """Process several Jira issues, multiplexing their Jira calls over HTTP/2"""
+        # Fetch and comment on each issue once, even if it is listed repeatedly
+        issue_keys = list(dict.fromkeys(issue_keys))
+
+        limits = httpx.Limits(max_connections=Config.JIRA_MAX_CONNECTIONS)
+        async with httpx.AsyncClient(http2=True, limits=limits, auth=self.auth, headers=self.headers) as client:
+            issues = await asyncio.gather(*(self.get_jira_issue_async(client, key) for key in issue_keys))
+
+            comments = {
+                issue_key: self.build_issue_comment(issue_key, issue, threshold)
+                for issue_key, issue in zip(issue_keys, issues)
+            }
+
+            to_post = [(key, comment) for key, comment in comments.items() if comment is not None]
+            posted = await asyncio.gather(*(
+                self.update_jira_comment_async(client, key, comment) for key, comment in to_post
+            ))
 
-        return success
+        results = {issue_key: False for issue_key in issue_keys}
+        results.update({key: success for (key, _), success in zip(to_post, posted)})
+        return results
 
 def main():
     # Configuration - Update these with your actual Jira credentials
@@ -2,14 +2,183 @@ import pandas as pd
 from sentence_transformers import SentenceTransformer
 import duckdb
 import numpy as np
-import json
+import simsimd
+from numba import njit, prange
+import asyncio
+import functools
 from typing import List, Dict, Optional
 import os
+import threading
+import orjson
+from collections import Counter
 from datetime import datetime
-import openai
+from concurrent.futures import ThreadPoolExecutor
+import onnxruntime as ort
+from openai import OpenAI, AsyncOpenAI
 from atlassian import Jira
 from atlassian.errors import ApiError
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import Config
+from incident_search import INCIDENT_FIELDS, SIMILARITY_SQL, load_incident_vectors, \
+    load_embedding_model, is_searchable, encode_texts, encode_query
+
+def export_local_llm(output_dir: str, model_id: str = Config.LOCAL_LLM_MODEL_ID):
+    """Export the local analysis LLM to ONNX with dynamic int8 quantization"""
+    from optimum.onnxruntime import ORTModelForCausalLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    model = ORTModelForCausalLM.from_pretrained(model_id, export=True)
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantizer.quantize(
+        save_dir=output_dir,
+        quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    )
+    AutoTokenizer.from_pretrained(model_id).save_pretrained(output_dir)
+    print(f"✅ Quantized {model_id} saved to {output_dir}")
+
+def load_local_llm():
+    """Load the int8 ONNX analysis LLM and its tokenizer from Config.LOCAL_LLM_PATH"""
+    # Only needed for the local backend, so not imported at module level
+    from optimum.onnxruntime import ORTModelForCausalLM
+    from transformers import AutoTokenizer
+    from lmformatenforcer.integrations.transformers import build_token_enforcer_tokenizer_data
+
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    tokenizer = AutoTokenizer.from_pretrained(Config.LOCAL_LLM_PATH)
+    model = ORTModelForCausalLM.from_pretrained(
+        Config.LOCAL_LLM_PATH,
+        provider="CPUExecutionProvider",
+        session_options=session_options
+    )
+    # Vocabulary data for JSON-constrained decoding, built once per model
+    return tokenizer, model, build_token_enforcer_tokenizer_data(tokenizer)
+
+def create_jira_session() -> requests.Session:
+    """Create the pooled, keep-alive HTTP session shared by every Jira client"""
+    session = requests.Session()
+    # Size the pool for concurrent batch workers; urllib3 only retries
+    # idempotent methods, so comments are never posted twice
+    session.mount("https://", HTTPAdapter(
+        pool_connections=Config.BATCH_MAX_WORKERS,
+        pool_maxsize=2 * Config.BATCH_MAX_WORKERS,
+        max_retries=Retry(total=3, backoff_factor=0.3)
+    ))
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+# One session per process so every updater reuses the same TLS connections
+_JIRA_SESSION = create_jira_session()
+
+# Constant parts of the LLM analysis prompt; only the description and the
+# similar incidents between them change per issue
+LLM_PROMPT_HEAD = """
+You are an expert incident analyst. Analyze the following incident description and historical similar incidents to provide insights and recommendations.
+
+Current Incident Description:
+"""
+
+LLM_PROMPT_TAIL = """
+
+Based on this information, provide:
+1. Key patterns and similarities you observe
+2. Most likely root causes based on historical data
+3. Recommended actions and next steps
+4. Confidence level (0-1) in your analysis
+5. Suggested assignee or team based on who handled similar incidents
+
+Format your response as JSON with the following structure:
+{
+    "patterns": ["pattern1", "pattern2"],
+    "root_causes": ["cause1", "cause2"],
+    "recommendations": ["action1", "action2"],
+    "confidence_score": 0.8,
+    "suggested_assignee": "team_name",
+    "suggested_group": "group_name"
+}
+"""
+
+# Output schema the local LLM is constrained to while decoding
+LLM_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "patterns": {"type": "array", "items": {"type": "string", "maxLength": 200}, "maxItems": 5},
+        "root_causes": {"type": "array", "items": {"type": "string", "maxLength": 200}, "maxItems": 5},
+        "recommendations": {"type": "array", "items": {"type": "string", "maxLength": 200}, "maxItems": 5},
+        "confidence_score": {"type": "number", "minimum": 0, "maximum": 1},
+        "suggested_assignee": {"type": "string", "maxLength": 100},
+        "suggested_group": {"type": "string", "maxLength": 100}
+    },
+    "required": ["patterns", "root_causes", "recommendations", "confidence_score",
+                 "suggested_assignee", "suggested_group"]
+}
+
+def quantize_int8(vectors: np.ndarray) -> np.ndarray:
+    """Symmetrically quantize each row to int8 using its own max-abs scale"""
+    scales = np.abs(vectors).max(axis=1, keepdims=True) / 127.0
+    scales[scales == 0] = 1.0
+    return np.ascontiguousarray(np.round(vectors / scales).astype(np.int8))
+
+# Rows scored per parallel task in the fused top-K kernel
+FUSED_CHUNK_ROWS = 1024
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _top_k_above_kernel(corpus, query, k, threshold):
+    """Score int8 rows by cosine and keep each chunk's best k above threshold"""
+    n_rows, dimension = corpus.shape
+    n_chunks = (n_rows + FUSED_CHUNK_ROWS - 1) // FUSED_CHUNK_ROWS
+    best_scores = np.full((n_chunks, k), -np.inf, dtype=np.float32)
+    best_rows = np.full((n_chunks, k), -1, dtype=np.int64)
+
+    query_norm_sq = 0
+    for d in range(dimension):
+        query_norm_sq += np.int32(query[d]) * np.int32(query[d])
+
+    for chunk in prange(n_chunks):
+        start = chunk * FUSED_CHUNK_ROWS
+        end = min(start + FUSED_CHUNK_ROWS, n_rows)
+        weakest = 0
+
+        for row in range(start, end):
+            dot = 0
+            norm_sq = 0
+            for d in range(dimension):
+                value = np.int32(corpus[row, d])
+                dot += value * np.int32(query[d])
+                norm_sq += value * value
+
+            if norm_sq == 0 or query_norm_sq == 0:
+                continue
+            score = dot / np.sqrt(np.float32(norm_sq) * np.float32(query_norm_sq))
+
+            # Replace the weakest kept entry, then find the new weakest
+            if score >= threshold and score > best_scores[chunk, weakest]:
+                best_scores[chunk, weakest] = score
+                best_rows[chunk, weakest] = row
+                weakest = 0
+                for j in range(1, k):
+                    if best_scores[chunk, j] < best_scores[chunk, weakest]:
+                        weakest = j
+
+    return best_scores.ravel(), best_rows.ravel()
+
+# Numba's default workqueue threading layer aborts the process when parallel
+# kernels are entered from several threads at once (batch workers, Flask
+# request threads). The kernel already uses every core, so calls are serialized
+_FUSED_KERNEL_LOCK = threading.Lock()
+
+def fused_top_k(corpus: np.ndarray, query: np.ndarray, k: int, threshold: float):
+    """Return (rows, scores) of the k best matches above threshold in one pass"""
+    with _FUSED_KERNEL_LOCK:
+        scores, rows = _top_k_above_kernel(corpus, query, k, np.float32(threshold))
+    found = rows >= 0
+    scores, rows = scores[found], rows[found]
+    order = np.argsort(-scores)[:k]
+    return rows[order], scores[order]
 
 class EnhancedJiraCommentUpdater:
     def __init__(self):
@@ -17,132 +186,298 @@ class EnhancedJiraCommentUpdater:
         self.jira_base_url = Config.JIRA_BASE_URL.rstrip('/')
         self.jira_username = Config.JIRA_USERNAME
         self.jira_api_token = Config.JIRA_API_TOKEN
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.con = duckdb.connect(database=self.db_file, read_only=True)
-
-        # Setup Jira client using Atlassian Python API
+        # The model, database and Jira client are created on first use so
+        # Jira-only operations and web startup stay cheap
+        self._model = None
+        self._con = None
+        self._corpus = None
+        self._inc_meta = None
+        self._use_vector_index = None
+        self._jira = None
+        self._jira_initialized = False
+        self._local_llm = None
+        self._init_lock = threading.RLock()
+        # Generation already uses every core, so local LLM calls run one at a time
+        self._local_llm_lock = threading.Lock()
+
+        # Cache query embeddings so repeated descriptions and retries skip the model
+        self._encode_query = functools.lru_cache(maxsize=Config.QUERY_CACHE_SIZE)(self._encode_query)
+
+        # Setup the LLM backend if available; OpenAI is only used when opted into
+        self.llm_available = Config.has_llm_config()
+        if self.llm_available and Config.LLM_BACKEND == "openai":
+            self.llm_client = OpenAI(api_key=Config.OPENAI_API_KEY)
+
+    @property
+    def model(self) -> SentenceTransformer:
+        """Sentence embedding model, loaded on first use"""
+        if self._model is None:
+            with self._init_lock:
+                if self._model is None:
+                    self._model = load_embedding_model()
+        return self._model
+
+    @property
+    def local_llm(self):
+        """Local int8 ONNX analysis LLM and tokenizer, loaded on first use"""
+        if self._local_llm is None:
+            with self._init_lock:
+                if self._local_llm is None:
+                    self._local_llm = load_local_llm()
+        return self._local_llm
+
+    @property
+    def con(self) -> duckdb.DuckDBPyConnection:
+        """Read-only DuckDB connection, opened on first use"""
+        if self._con is None:
+            with self._init_lock:
+                if self._con is None:
+                    con = duckdb.connect(database=self.db_file, read_only=True, config=Config.get_duckdb_config())
+                    try:
+                        con.execute("LOAD vss")
+                    except duckdb.Error as e:
+                        print(f"⚠️  vss extension unavailable, using in-memory similarity search: {e}")
+                    self._con = con
+        return self._con
+
+    @property
+    def use_vector_index(self) -> bool:
+        """Whether similarity search can be served by the persisted HNSW index"""
+        if self._use_vector_index is None:
+            with self._init_lock:
+                if self._use_vector_index is None:
+                    vss_loaded = self.con.execute("""
+                        SELECT COUNT(*) > 0
+                        FROM duckdb_extensions()
+                        WHERE extension_name = 'vss' AND loaded
+                    """).fetchone()[0]
+                    index_exists = self.con.execute("""
+                        SELECT COUNT(*) > 0
+                        FROM duckdb_indexes()
+                        WHERE table_name = 'incidents' AND index_name = ?
+                    """, [Config.VECTOR_INDEX_NAME]).fetchone()[0]
+                    self._use_vector_index = bool(vss_loaded and index_exists)
+        return self._use_vector_index
+
+    def _ensure_corpus(self):
+        """Load the in-memory corpus if it has not been loaded yet"""
+        if self._corpus is None:
+            with self._init_lock:
+                if self._corpus is None:
+                    self.reload_corpus()
+
+    @property
+    def corpus(self) -> np.ndarray:
+        """Quantized incident vectors, loaded on first use"""
+        self._ensure_corpus()
+        return self._corpus
+
+    @property
+    def inc_meta(self) -> Dict[str, list]:
+        """Incident metadata columns aligned with the corpus rows"""
+        self._ensure_corpus()
+        return self._inc_meta
+
+    @property
+    def jira(self) -> Optional[Jira]:
+        """Jira client using Atlassian Python API, created on first use"""
+        if not self._jira_initialized:
+            with self._init_lock:
+                if not self._jira_initialized:
+                    self._jira = self._create_jira_client()
+                    self._jira_initialized = True
+        return self._jira
+
+    def _create_jira_client(self) -> Optional[Jira]:
+        """Setup Jira client using Atlassian Python API"""
         try:
-            self.jira = JIRA(
-                server=self.jira_base_url,
-                basic_auth=(self.jira_username, self.jira_api_token)
+            jira = Jira(
+                url=self.jira_base_url,
+                username=self.jira_username,
+                password=self.jira_api_token,
+                session=_JIRA_SESSION
             )
             print("✅ Jira client initialized successfully")
+            return jira
         except Exception as e:
             print(f"❌ Failed to initialize Jira client: {e}")
-            self.jira = None
+            return None
 
-        # Setup OpenAI if available
-        if Config.has_llm_config():
-            openai.api_key = Config.OPENAI_API_KEY
-            self.llm_available = True
-        else:
-            self.llm_available = False
+    def reload_corpus(self):
+        """Load incident metadata and vectors into memory for similarity search"""
+        corpus, inc_meta = load_incident_vectors(self.con)
+
+        # L2-normalize once, then keep only the int8 copy in memory
+        norms = np.linalg.norm(corpus, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        with self._init_lock:
+            # Metadata is kept column-wise, aligned with the corpus rows
+            self._inc_meta = inc_meta
+            self._corpus = quantize_int8(corpus / norms)
 
-    def cosine_similarity(self, a, b):
-        """Calculate cosine similarity between two vectors"""
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+    def _encode_query(self, text: str) -> np.ndarray:
+        """Embed a Jira description, cached per updater"""
+        return encode_query(self.model, text)
 
     def search_similar_incidents(self, jira_description: str, threshold: float = None, limit: int = None) -> List[Dict]:
         """Search for similar incidents based on Jira description"""
+        if not is_searchable(jira_description):
+            return []
+
+        # Generate embedding for the Jira description
+        query_vector = self._encode_query(jira_description)
+
+        return self.search_similar_incidents_by_vector(query_vector, threshold, limit)
+
+    def encode_descriptions(self, descriptions: List[str]) -> np.ndarray:
+        """Embed many descriptions in batched forward passes"""
+        return encode_texts(self.model, descriptions)
+
+    def search_similar_incidents_by_vector(self, query_vector: np.ndarray, threshold: float = None, limit: int = None) -> List[Dict]:
+        """Search for similar incidents given a precomputed, normalized query vector"""
         if threshold is None:
             threshold = Config.SIMILARITY_THRESHOLD
         if limit is None:
             limit = Config.MAX_SIMILAR_INCIDENTS
 
-        # Generate embedding for the Jira description
-        query_vector = self.model.encode([jira_description])[0]
+        if self.use_vector_index:
+            return self._search_vector_index(query_vector, threshold, limit)
 
-        # Create similarity function in DuckDB
-        self.con.create_function("cosine_similarity", self.cosine_similarity, ["FLOAT[]", "FLOAT[]"], float)
+        limit = min(limit, len(self.corpus))
+        if limit <= 0:
+            return []
 
-        # Search query
-        sql_query = """
-        SELECT INC, "Short Desc", "Created Date", "Updated Date", Assignee, "Group", "Created By", "Updated By ",
-               cosine_similarity(vector, ?::FLOAT[]) AS similarity
-        FROM incidents
-        ORDER BY similarity DESC
-        LIMIT ?
-        """
+        # Cosine is invariant to the per-vector quantization scales, so the int8
+        # kernels score the quantized vectors directly
+        query_i8 = quantize_int8(query_vector[np.newaxis, :])
 
-        results = self.con.execute(sql_query, [query_vector.tolist(), limit]).fetchall()
+        if len(self.corpus) > Config.FUSED_SEARCH_MIN_ROWS:
+            # Large corpora: score, threshold and select top-K in one parallel pass
+            top, scores = fused_top_k(self.corpus, query_i8[0], limit, threshold)
+        else:
+            sims = 1.0 - np.asarray(simsimd.cdist(query_i8, self.corpus, metric="cosine"))[0]
+            # Partition out the top-K in O(N), then sort only those K
+            top = np.argpartition(sims, -limit)[-limit:]
+            top = top[np.argsort(-sims[top])]
+            top = top[sims[top] >= threshold]
+            scores = sims[top]
 
         similar_incidents = []
-        for row in results:
-            if row[8] >= threshold:  # similarity score
-                similar_incidents.append({
-                    'INC': row[0],
-                    'Short Desc': row[1],
-                    'Created Date': row[2],
-                    'Updated Date': row[3],
-                    'Assignee': row[4],
-                    'Group': row[5],
-                    'Created By': row[6],
-                    'Updated By': row[7],
-                    'similarity': row[8]
-                })
+        for i, score in zip(top, scores):
+            incident = {field: column[i] for field, column in self.inc_meta.items()}
+            incident['similarity'] = float(score)
+            similar_incidents.append(incident)
 
         return similar_incidents
 
+    def _search_vector_index(self, query_vector: np.ndarray, threshold: float, limit: int) -> List[Dict]:
+        """Search the HNSW index; vectors are normalized so inner product is cosine"""
+        # A cursor per call keeps concurrent batch workers off a shared connection
+        with self.con.cursor() as cursor:
+            results = cursor.execute(SIMILARITY_SQL, {
+                'query_vector': query_vector,
+                'limit': limit,
+                'threshold': threshold
+            }).fetchall()
+
+        return [{**dict(zip(INCIDENT_FIELDS, row)), 'similarity': row[8]} for row in results]
+
+    def _build_llm_messages(self, jira_description: str, similar_incidents: List[Dict]) -> List[Dict]:
+        """Build the chat messages asking the LLM to analyze the similar incidents"""
+        incidents_text = "".join(
+            f"\nINC-{incident['INC']}: {incident['Short Desc']}\n"
+            f"- Created: {incident['Created Date']}, Updated: {incident['Updated Date']}\n"
+            f"- Assignee: {incident['Assignee']}, Group: {incident['Group']}\n"
+            f"- Created by: {incident['Created By']}, Updated by: {incident['Updated By']}\n"
+            for incident in similar_incidents
+        )
+
+        prompt = f"{LLM_PROMPT_HEAD}{jira_description}\n\nHistorical Similar Incidents:\n{incidents_text}{LLM_PROMPT_TAIL}"
+        return [{"role": "user", "content": prompt}]
+
+    def _parse_llm_result(self, llm_result: str, jira_description: str, similar_incidents: List[Dict]) -> Dict:
+        """Parse the LLM's JSON answer, falling back to rule-based analysis"""
+        try:
+            return orjson.loads(llm_result)
+        except orjson.JSONDecodeError:
+            # If LLM didn't return valid JSON, fall back to rule-based analysis
+            print("LLM response was not valid JSON, falling back to rule-based analysis")
+            return self.analyze_historical_patterns(similar_incidents, jira_description)
+
+    def _generate_local(self, messages: List[Dict]) -> str:
+        """Run the local LLM greedily, constrained to LLM_ANALYSIS_SCHEMA JSON"""
+        from lmformatenforcer import JsonSchemaParser
+        from lmformatenforcer.integrations.transformers import build_transformers_prefix_allowed_tokens_fn
+
+        tokenizer, model, tokenizer_data = self.local_llm
+
+        prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        inputs = tokenizer(prompt, return_tensors="pt")
+
+        # Each step only allows tokens that keep the output a valid prefix of
+        # a document matching the schema
+        allowed_tokens = build_transformers_prefix_allowed_tokens_fn(tokenizer_data, JsonSchemaParser(LLM_ANALYSIS_SCHEMA))
+
+        with self._local_llm_lock:
+            output = model.generate(
+                **inputs,
+                max_new_tokens=Config.LOCAL_LLM_MAX_NEW_TOKENS,
+                do_sample=False,
+                prefix_allowed_tokens_fn=allowed_tokens
+            )
+
+        prompt_length = inputs["input_ids"].shape[1]
+        return tokenizer.decode(output[0, prompt_length:], skip_special_tokens=True)
+
     def analyze_with_llm(self, jira_description: str, similar_incidents: List[Dict]) -> Dict:
         """Analyze incidents using LLM for better insights"""
         if not self.llm_available or not similar_incidents:
             return self.analyze_historical_patterns(similar_incidents, jira_description)
 
         try:
-            # Prepare context for LLM
-            incidents_text = ""
-            for incident in similar_incidents:
-                incidents_text += f"""
-INC-{incident['INC']}: {incident['Short Desc']}
-- Created: {incident['Created Date']}, Updated: {incident['Updated Date']}
-- Assignee: {incident['Assignee']}, Group: {incident['Group']}
-- Created by: {incident['Created By']}, Updated by: {incident['Updated By']}
-"""
+            messages = self._build_llm_messages(jira_description, similar_incidents)
+
+            if Config.LLM_BACKEND == "openai":
+                response = self.llm_client.chat.completions.create(
+                    model=Config.LLM_MODEL,
+                    messages=messages,
+                    max_tokens=Config.LLM_MAX_TOKENS,
+                    temperature=0.3,
+                    response_format={"type": "json_object"}
+                )
+                llm_result = response.choices[0].message.content
+            else:
+                llm_result = self._generate_local(messages)
+
+            llm_result = llm_result.strip()
+            return self._parse_llm_result(llm_result, jira_description, similar_incidents)
 
-            prompt = f"""
-You are an expert incident analyst. Analyze the following incident description and historical similar incidents to provide insights and recommendations.
-
-Current Incident Description:
-{jira_description}
-
-Historical Similar Incidents:
-{incidents_text}
+        except Exception as e:
+            print(f"Error with LLM analysis: {e}")
+            return self.analyze_historical_patterns(similar_incidents, jira_description)
 
-Based on this information, provide:
-1. Key patterns and similarities you observe
-2. Most likely root causes based on historical data
-3. Recommended actions and next steps
-4. Confidence level (0-1) in your analysis
-5. Suggested assignee or team based on who handled similar incidents
+    async def analyze_with_llm_async(self, llm_client: Optional[AsyncOpenAI], jira_description: str,
+                                     similar_incidents: List[Dict]) -> Dict:
+        """Async variant of analyze_with_llm for the batch pipeline"""
+        if not self.llm_available or not similar_incidents:
+            return self.analyze_historical_patterns(similar_incidents, jira_description)
 
-Format your response as JSON with the following structure:
-{{
-    "patterns": ["pattern1", "pattern2"],
-    "root_causes": ["cause1", "cause2"],
-    "recommendations": ["action1", "action2"],
-    "confidence_score": 0.8,
-    "suggested_assignee": "team_name",
-    "suggested_group": "group_name"
-}}
-"""
+        if llm_client is None:
+            # Local generation is CPU-bound, so keep it off the event loop
+            return await asyncio.to_thread(self.analyze_with_llm, jira_description, similar_incidents)
 
-            response = openai.ChatCompletion.create(
+        try:
+            response = await llm_client.chat.completions.create(
                 model=Config.LLM_MODEL,
-                messages=[{"role": "user", "content": prompt}],
+                messages=self._build_llm_messages(jira_description, similar_incidents),
                 max_tokens=Config.LLM_MAX_TOKENS,
-                temperature=0.3
+                temperature=0.3,
+                response_format={"type": "json_object"}
             )
 
             llm_result = response.choices[0].message.content.strip()
-
-            # Try to parse JSON response
-            try:
-                parsed_result = json.loads(llm_result)
-                return parsed_result
-            except json.JSONDecodeError:
-                # If LLM didn't return valid JSON, fall back to rule-based analysis
-                print("LLM response was not valid JSON, falling back to rule-based analysis")
-                return self.analyze_historical_patterns(similar_incidents, jira_description)
+            return self._parse_llm_result(llm_result, jira_description, similar_incidents)
 
         except Exception as e:
             print(f"Error with LLM analysis: {e}")
@@ -162,25 +497,12 @@ Format your response as JSON with the following structure:
         if not similar_incidents:
             return analysis
 
-        # Group by assignee and group to find patterns
-        assignee_patterns = {}
-        group_patterns = {}
-
-        for incident in similar_incidents:
-            assignee = incident.get('Assignee', 'Unknown')
-            group = incident.get('Group', 'Unknown')
+        # Count assignees and groups to find the most common ones
+        assignee_counts = Counter(incident.get('Assignee', 'Unknown') for incident in similar_incidents)
+        group_counts = Counter(incident.get('Group', 'Unknown') for incident in similar_incidents)
 
-            if assignee not in assignee_patterns:
-                assignee_patterns[assignee] = []
-            assignee_patterns[assignee].append(incident)
-
-            if group not in group_patterns:
-                group_patterns[group] = []
-            group_patterns[group].append(incident)
-
-        # Find most common assignee and group
-        most_common_assignee = max(assignee_patterns.keys(), key=lambda k: len(assignee_patterns[k]))
-        most_common_group = max(group_patterns.keys(), key=lambda k: len(group_patterns[k]))
+        most_common_assignee = assignee_counts.most_common(1)[0][0]
+        most_common_group = group_counts.most_common(1)[0][0]
 
         analysis['suggested_assignee'] = most_common_assignee
         analysis['suggested_group'] = most_common_group
@@ -259,70 +581,77 @@ Format your response as JSON with the following structure:
     def generate_analysis_comment(self, jira_description: str, similar_incidents: List[Dict], analysis: Dict) -> str:
         """Generate a comprehensive comment for Jira based on analysis"""
 
-        comment = f"""**Automated Incident Analysis Report**
-
-**Original Description:** {jira_description}
-
-**Similar Historical Incidents Found:**
-"""
+        parts = [f"**Automated Incident Analysis Report**\n\n**Original Description:** {jira_description}\n\n**Similar Historical Incidents Found:**\n"]
 
         for incident in similar_incidents:
-            comment += f"""
-• **INC-{incident['INC']}**: {incident['Short Desc']}
-  - Created: {incident['Created Date']}
-  - Updated: {incident['Updated Date']}
-  - Assignee: {incident['Assignee']}
-  - Group: {incident['Group']}
-  - Similarity: {incident['similarity']:.2f}
-"""
+            parts.append(
+                f"\n• **INC-{incident['INC']}**: {incident['Short Desc']}\n"
+                f"  - Created: {incident['Created Date']}\n"
+                f"  - Updated: {incident['Updated Date']}\n"
+                f"  - Assignee: {incident['Assignee']}\n"
+                f"  - Group: {incident['Group']}\n"
+                f"  - Similarity: {incident['similarity']:.2f}\n"
+            )
 
-        comment += f"""
-**Analysis Summary:**
-"""
-        for pattern in analysis['patterns']:
-            comment += f"• {pattern}\n"
+        parts.append("\n**Analysis Summary:**\n")
+        parts.extend(f"• {pattern}\n" for pattern in analysis['patterns'])
 
-        comment += f"""
-**Root Causes (Identified):**
-"""
-        for cause in analysis.get('root_causes', []):
-            comment += f"• {cause}\n"
+        parts.append("\n**Root Causes (Identified):**\n")
+        parts.extend(f"• {cause}\n" for cause in analysis.get('root_causes', []))
 
         if not analysis.get('root_causes'):
-            comment += "• No specific root causes identified from historical data\n"
+            parts.append("• No specific root causes identified from historical data\n")
+
+        parts.append("\n**Recommended Actions:**\n")
+        parts.extend(f"• {recommendation}\n" for recommendation in analysis['recommendations'])
+
+        parts.append(
+            f"\n**Suggested Assignment:**\n"
+            f"• Assignee: {analysis.get('suggested_assignee', 'TBD')}\n"
+            f"• Group: {analysis.get('suggested_group', 'TBD')}\n"
+            f"\n**Analysis Confidence:** {analysis.get('confidence_score', 0):.2f}\n"
+            f"\n---\n"
+            f"*This analysis was generated automatically using historical incident data and AI-powered pattern recognition.*\n"
+        )
+        return "".join(parts)
+
+    def get_issue_description(self, issue_key: str) -> Optional[str]:
+        """Fetch a Jira issue and return its description, if it has one"""
+        # Get Jira issue details
+        issue = self.get_jira_issue(issue_key)
+        if not issue:
+            print(f"Could not fetch issue {issue_key}")
+            return None
 
-        comment += f"""
-**Recommended Actions:**
-"""
-        for recommendation in analysis['recommendations']:
-            comment += f"• {recommendation}\n"
+        # Extract description
+        description = issue['fields'].get('description', '')
+        if not description:
+            print(f"No description found for issue {issue_key}")
+            return None
 
-        comment += f"""
-**Suggested Assignment:**
-• Assignee: {analysis.get('suggested_assignee', 'TBD')}
-• Group: {analysis.get('suggested_group', 'TBD')}
+        return description
 
-**Analysis Confidence:** {analysis.get('confidence_score', 0):.2f}
+    def comment_on_issue(self, issue_key: str, description: str, similar_incidents: List[Dict]) -> bool:
+        """Analyze similar incidents and add the resulting comment to the issue"""
+        if not similar_incidents:
+            print(f"No similar incidents found for {issue_key}")
+            return False
 
----
-*This analysis was generated automatically using historical incident data and AI-powered pattern recognition.*
-"""
-        return comment
+        print(f"Found {len(similar_incidents)} similar incidents")
+
+        # Perform analysis (with LLM if available)
+        analysis = self.analyze_with_llm(description, similar_incidents)
+
+        # Generate and add comment
+        comment = self.generate_analysis_comment(description, similar_incidents, analysis)
+        return self.update_jira_comment(issue_key, comment)
 
     def process_jira_issue(self, issue_key: str, threshold: float = None) -> bool:
         """Main function to process a Jira issue and update its comments"""
         print(f"Processing Jira issue: {issue_key}")
 
-        # Get Jira issue details
-        issue = self.get_jira_issue(issue_key)
-        if not issue:
-            print(f"Could not fetch issue {issue_key}")
-            return False
-
-        # Extract description
-        description = issue['fields'].get('description', '')
+        description = self.get_issue_description(issue_key)
         if not description:
-            print(f"No description found for issue {issue_key}")
             return False
 
         print(f"Analyzing description: {description[:100]}...")
@@ -330,35 +659,89 @@ Format your response as JSON with the following structure:
         # Search for similar incidents
         similar_incidents = self.search_similar_incidents(description, threshold)
 
+        return self.comment_on_issue(issue_key, description, similar_incidents)
+
+    async def _comment_on_issue_async(self, llm_client: Optional[AsyncOpenAI], issue_key: str, description: str,
+                                      similar_incidents: List[Dict]) -> bool:
+        """Async variant of comment_on_issue"""
         if not similar_incidents:
             print(f"No similar incidents found for {issue_key}")
             return False
 
         print(f"Found {len(similar_incidents)} similar incidents")
 
-        # Perform analysis (with LLM if available)
-        analysis = self.analyze_with_llm(description, similar_incidents)
+        analysis = await self.analyze_with_llm_async(llm_client, description, similar_incidents)
 
-        # Generate and add comment
         comment = self.generate_analysis_comment(description, similar_incidents, analysis)
-        success = self.update_jira_comment(issue_key, comment)
+        return await asyncio.to_thread(self.update_jira_comment, issue_key, comment)
+
+    async def _batch_process_async(self, issue_keys: List[str], threshold: float = None) -> Dict[str, bool]:
+        """Run one batch with an OpenAI client scoped to this event loop"""
+        # asyncio.to_thread uses the loop's default executor, sized min(32, cpus + 4)
+        # rather than to the batch limit; asyncio.run shuts this one down afterwards
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=Config.BATCH_MAX_WORKERS)
+        )
+
+        if self.llm_available and Config.LLM_BACKEND == "openai":
+            # httpx connections belong to the loop that opened them and every
+            # batch runs on a fresh loop, so the client lives for one batch
+            async with AsyncOpenAI(api_key=Config.OPENAI_API_KEY) as llm_client:
+                return await self._pipeline_issues(llm_client, issue_keys, threshold)
+        return await self._pipeline_issues(None, issue_keys, threshold)
+
+    async def _pipeline_issues(self, llm_client: Optional[AsyncOpenAI], issue_keys: List[str],
+                               threshold: float = None) -> Dict[str, bool]:
+        """Pipeline Jira and LLM network waits across all issues"""
+        results = {issue_key: False for issue_key in issue_keys}
+        # Bound in-flight issues so Jira and OpenAI are not flooded
+        semaphore = asyncio.Semaphore(Config.BATCH_MAX_WORKERS)
+
+        async def fetch_description(issue_key: str) -> Optional[str]:
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(self.get_issue_description, issue_key)
+                except Exception as e:
+                    print(f"Error processing {issue_key}: {e}")
+                    return None
+
+        async def search_and_comment(issue_key: str, description: str, query_vector: np.ndarray) -> bool:
+            async with semaphore:
+                try:
+                    similar_incidents = await asyncio.to_thread(
+                        self.search_similar_incidents_by_vector, query_vector, threshold
+                    )
+                    return await self._comment_on_issue_async(llm_client, issue_key, description, similar_incidents)
+                except Exception as e:
+                    print(f"Error processing {issue_key}: {e}")
+                    return False
+
+        # Fetch every description first so they can be embedded together
+        fetched = await asyncio.gather(*(fetch_description(issue_key) for issue_key in issue_keys))
+        descriptions = {
+            issue_key: description
+            for issue_key, description in zip(issue_keys, fetched)
+            if description and is_searchable(description)
+        }
 
-        return success
+        if not descriptions:
+            return results
 
-    def batch_process_issues(self, issue_keys: List[str]) -> Dict[str, bool]:
-        """Process multiple Jira issues and return results"""
-        results = {}
+        # One batched forward pass instead of one per issue
+        query_vectors = await asyncio.to_thread(self.encode_descriptions, list(descriptions.values()))
 
-        for issue_key in issue_keys:
-            try:
-                success = self.process_jira_issue(issue_key)
-                results[issue_key] = success
-            except Exception as e:
-                print(f"Error processing {issue_key}: {e}")
-                results[issue_key] = False
+        outcomes = await asyncio.gather(*(
+            search_and_comment(issue_key, description, query_vector)
+            for (issue_key, description), query_vector in zip(descriptions.items(), query_vectors)
+        ))
+        results.update(zip(descriptions.keys(), outcomes))
 
         return results
 
+    def batch_process_issues(self, issue_keys: List[str], threshold: float = None) -> Dict[str, bool]:
+        """Process multiple Jira issues and return results"""
+        return asyncio.run(self._batch_process_async(issue_keys, threshold))
+
 def main():
     """Main function for command line usage"""
     if not Config.validate_config():
@@ -7,8 +7,17 @@ This script tests the core functionality without requiring actual Jira credentia
 import sys
 import os
 import json
+import tempfile
+from datetime import datetime
 from unittest.mock import Mock, patch
-from jira_updater_enhanced import EnhancedJiraCommentUpdater
+import duckdb
+import numpy as np
+import pandas as pd
+import simsimd
+from jira_updater_enhanced import EnhancedJiraCommentUpdater, quantize_int8, fused_top_k
+from jira_updater import JiraCommentUpdater
+from excel_to_db_processor import ExcelToDBProcessor
+from incident_search import INCIDENT_FIELDS
 from config import Config
 from atlassian import Jira
 
@@ -197,6 +206,208 @@ def test_database_connection():
         print(f"❌ Database connection test failed: {e}")
         return False
 
+class FakeEmbeddingModel:
+    """Deterministic stand-in for the sentence embedding model"""
+
+    def get_sentence_embedding_dimension(self):
+        return Config.EMBEDDING_DIMENSION
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        vectors = np.vstack([
+            np.random.default_rng(sum(map(ord, text))).standard_normal(Config.EMBEDDING_DIMENSION)
+            for text in texts
+        ]).astype(np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+def create_incidents_db(db_file: str, rows: list):
+    """Create an incidents table with the current schema and the given rows"""
+    con = duckdb.connect(db_file)
+    con.execute(f"""
+        CREATE TABLE incidents (
+            INC VARCHAR PRIMARY KEY, "Short Desc" TEXT, "Created Date" TIMESTAMP, "Updated Date" TIMESTAMP,
+            Assignee VARCHAR, "Group" VARCHAR, "Created By" VARCHAR, "Updated By " VARCHAR,
+            vector FLOAT[{Config.EMBEDDING_DIMENSION}], json_file_path VARCHAR
+        )
+    """)
+    for row in rows:
+        con.execute("INSERT INTO incidents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)", row)
+    con.close()
+
+def test_search_kernels():
+    """Test int8 quantized scoring and the fused top-K kernel against brute force"""
+    print("🧪 Testing similarity search kernels...")
+
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((3000, Config.EMBEDDING_DIMENSION)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    query = corpus[42] + 0.1 * rng.standard_normal(Config.EMBEDDING_DIMENSION).astype(np.float32)
+    query /= np.linalg.norm(query)
+
+    corpus_i8 = quantize_int8(corpus)
+    query_i8 = quantize_int8(query[np.newaxis, :])
+    assert corpus_i8.dtype == np.int8 and np.abs(corpus_i8).max() == 127
+
+    # int8 cosine tracks the float cosine closely
+    exact = corpus @ query
+    sims = 1.0 - np.asarray(simsimd.cdist(query_i8, corpus_i8, metric="cosine"))[0]
+    assert np.abs(sims - exact).max() < 0.02
+    print("✅ SimSIMD int8 scores match float cosine")
+
+    # The fused kernel returns the brute-force top-K of the same int8 scores
+    rows, scores = fused_top_k(corpus_i8, query_i8[0], 5, 0.0)
+    brute = np.argsort(-sims)[:5]
+    assert rows.tolist() == brute.tolist() and rows[0] == 42
+    assert np.allclose(scores, sims[brute], atol=1e-4)
+
+    # A threshold above every score leaves nothing
+    rows, scores = fused_top_k(corpus_i8, query_i8[0], 5, 1.01)
+    assert len(rows) == 0
+    print("✅ Fused top-K matches brute force")
+
+    # The argpartition path returns the top-K in descending order, thresholded
+    updater = EnhancedJiraCommentUpdater()
+    updater._use_vector_index = False
+    updater._corpus = corpus_i8
+    updater._inc_meta = {field: [str(i) for i in range(len(corpus))] for field in INCIDENT_FIELDS}
+    results = updater.search_similar_incidents_by_vector(query, threshold=0.0, limit=5)
+    similarities = [incident['similarity'] for incident in results]
+    assert [incident['INC'] for incident in results] == [str(i) for i in brute]
+    assert similarities == sorted(similarities, reverse=True)
+    assert updater.search_similar_incidents_by_vector(query, threshold=1.01, limit=5) == []
+    print("✅ Argpartition search returns sorted, thresholded results")
+
+    return True
+
+def test_ingest_insert():
+    """Test ingest into a fresh database and migration of an old FLOAT[] table"""
+    print("🧪 Testing ingest insert...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, "incidents.duckdb")
+
+        # A table from before the fixed-width schema, with an old-model vector
+        con = duckdb.connect(db_file)
+        con.execute("""
+            CREATE TABLE incidents (
+                INC VARCHAR PRIMARY KEY, "Short Desc" TEXT, "Created Date" TIMESTAMP, "Updated Date" TIMESTAMP,
+                Assignee VARCHAR, "Group" VARCHAR, "Created By" VARCHAR, "Updated By " VARCHAR,
+                vector FLOAT[], json_file_path VARCHAR
+            )
+        """)
+        con.execute("""
+            INSERT INTO incidents VALUES ('100', 'old incident description', NULL, NULL,
+                'jack', 'app-dev', 'RR', 'jack', [0.5, 0.5]::FLOAT[], NULL)
+        """)
+        con.close()
+
+        # Mixed date formats and no "Updated By " column, as Excel exports vary
+        excel_rows = pd.DataFrame({
+            'INC': ['100', '101', '102', '102', '103'],
+            'Short Desc': ['old incident description', 'UI is not loading', 'UI is not loading', 'dup', None],
+            'Created Date': ['2025-01-05', '01/05/2025', datetime(2025, 1, 5), datetime(2025, 1, 5), 'not a date'],
+            'Updated Date': ['2025-10-09'] * 5,
+            'Assignee': ['jack', 'xyz', 'abc', 'abc', 'abc'],
+            'Group': ['app-dev', 'app-dev', 'ops', 'ops', 'ops'],
+            'Created By': ['RR'] * 5
+        })
+
+        with patch.object(Config, 'DB_FILE', db_file), \
+             patch('excel_to_db_processor.load_embedding_model', return_value=FakeEmbeddingModel()):
+            processor = ExcelToDBProcessor()
+            try:
+                staged_rows = processor.normalize_excel_rows(excel_rows)
+                incidents = processor.prepare_incident_data(staged_rows, tmp_dir)
+                assert sorted(incidents['INC']) == ['101', '102', '103']
+                assert incidents['Created Date'].tolist()[:2] == [datetime(2025, 1, 5)] * 2
+                assert pd.isna(incidents['Created Date'].iloc[2])
+
+                processor.insert_incidents(incidents)
+                processor.embed_missing_vectors()
+
+                column_type = processor.con.execute("""
+                    SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'incidents' AND column_name = 'vector'
+                """).fetchone()[0]
+                assert column_type == f"FLOAT[{Config.EMBEDDING_DIMENSION}]"
+
+                rows = dict(processor.con.execute("""
+                    SELECT INC, array_inner_product(vector, vector) FROM incidents
+                """).fetchall())
+            finally:
+                processor.close_connection()
+
+        # Every described incident is stored normalized, the migrated row
+        # included; the one without a description has no vector
+        assert sorted(rows) == ['100', '101', '102', '103']
+        assert all(abs(rows[inc] - 1.0) < 1e-5 for inc in ['100', '101', '102'])
+        assert rows['103'] is None
+        print(f"✅ Inserted and migrated vectors as {column_type}")
+
+    return True
+
+def test_corpus_loading():
+    """Test that in-memory corpora keep NULL metadata and dates as Python values"""
+    print("🧪 Testing corpus loading with NULL metadata...")
+
+    vector = np.full(Config.EMBEDDING_DIMENSION, 1.0 / np.sqrt(Config.EMBEDDING_DIMENSION), dtype=np.float32)
+    created = datetime(2025, 1, 1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, "incidents.duckdb")
+        create_incidents_db(db_file, [
+            ('1', 'UI is not loading', created, None, None, None, 'RR', 'jack', vector),
+            ('2', 'UI is not loading', created, None, 'jack', 'app-dev', 'RR', 'jack', vector)
+        ])
+
+        # Enhanced updater: quantized corpus searched in memory
+        with patch.object(Config, 'DB_FILE', db_file), \
+             patch('jira_updater_enhanced.load_embedding_model', return_value=FakeEmbeddingModel()):
+            updater = EnhancedJiraCommentUpdater()
+            updater._use_vector_index = False
+            results = updater.search_similar_incidents("UI is not loading", threshold=-1.0)
+            analysis = updater.analyze_historical_patterns(results, "UI is not loading")
+            comment = updater.generate_analysis_comment("UI is not loading", results, analysis)
+            updater.con.close()
+
+        assert len(results) == 2
+        assert {incident['Assignee'] for incident in results} == {None, 'jack'}
+        assert all(incident['Created Date'] == created for incident in results)
+        assert "Created: 2025-01-01 00:00:00" in comment
+        print("✅ Enhanced corpus keeps None and datetime values")
+
+        # Basic updater: float corpus used when vss is not loaded
+        with patch('jira_updater._get_model', return_value=FakeEmbeddingModel()), \
+             patch('jira_updater._get_connection', side_effect=lambda db: duckdb.connect(db, read_only=True)):
+            basic = JiraCommentUpdater(db_file, Config.JIRA_BASE_URL, Config.JIRA_USERNAME, Config.JIRA_API_TOKEN)
+            basic.load_corpus()
+            results = basic._search_corpus(vector, 0.5, 5)
+            analysis = basic.analyze_historical_patterns(results, "UI is not loading")
+            basic.con.close()
+
+        assert {incident['Assignee'] for incident in results} == {None, 'jack'}
+        assert "Total similar incidents found: 2" in analysis['similar_patterns']
+        print("✅ Basic corpus keeps None values hashable for the cached analysis")
+
+    return True
+
+def test_llm_response_parsing():
+    """Test orjson parsing of LLM answers and the rule-based fallback"""
+    print("🧪 Testing LLM response parsing...")
+
+    updater = EnhancedJiraCommentUpdater()
+    incidents = [{'INC': '1', 'Assignee': 'jack', 'Group': 'app-dev'}]
+
+    parsed = updater._parse_llm_result('{"patterns": ["p"], "confidence_score": 0.9}', "desc", incidents)
+    assert parsed == {"patterns": ["p"], "confidence_score": 0.9}
+
+    fallback = updater._parse_llm_result('{"patterns": [', "desc", incidents)
+    assert fallback['suggested_assignee'] == 'jack'
+    print("✅ Valid JSON is parsed and truncated JSON falls back to rule-based analysis")
+
+    return True
+
 def run_all_tests():
     """Run all tests and report results"""
     print("🚀 Starting Jira Comment Updater Tests")
@@ -207,7 +418,11 @@ def run_all_tests():
         ("Database Connection", test_database_connection),
         ("Vector Search", test_vector_search),
         ("Analysis Generation", test_analysis_generation),
-        ("Comment Generation", test_comment_generation)
+        ("Comment Generation", test_comment_generation),
+        ("Search Kernels", test_search_kernels),
+        ("Ingest Insert", test_ingest_insert),
+        ("Corpus Loading", test_corpus_loading),
+        ("LLM Response Parsing", test_llm_response_parsing)
     ]
 
     passed = 0
@@ -215,7 +430,12 @@ def run_all_tests():
 
     for test_name, test_func in tests:
         print(f"\n📋 Running {test_name} test...")
-        if test_func():
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} test raised: {e!r}")
+            result = False
+        if result:
             passed += 1
             print(f"✅ {test_name} test PASSED")
         else:
@@ -1,23 +1,34 @@
 from flask import Flask, request, render_template, jsonify
+from flask.json.provider import JSONProvider
 from jira_updater_enhanced import EnhancedJiraCommentUpdater
 from config import Config
-import json
-import os
-from atlassian import Jira
+import orjson
+import threading
 from atlassian.errors import ApiError
 
+class OrjsonProvider(JSONProvider):
+    """Serialize JSON requests and responses with orjson"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
-# Initialize the updater
+# Initialize the updater; one instance shares the model, corpus and Jira
+# connection pool across all request threads
 updater = None
+updater_lock = threading.Lock()
 
 def get_updater():
     global updater
     if updater is None:
-        if Config.validate_config():
-            updater = EnhancedJiraCommentUpdater()
-        else:
-            updater = None
+        with updater_lock:
+            if updater is None and Config.validate_config():
+                updater = EnhancedJiraCommentUpdater()
     return updater
 
 @app.route('/')
@@ -82,7 +93,7 @@ def batch_process():
         return jsonify({'error': 'No valid issue keys found'}), 400
 
     try:
-        results = updater.batch_process_issues(issue_keys)
+        results = updater.batch_process_issues(issue_keys, threshold)
         return jsonify({
             'results': results,
             'total_processed': len(results),